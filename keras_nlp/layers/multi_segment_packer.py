@@ -18,12 +18,77 @@ import tensorflow as tf
 from tensorflow import keras
 
 from keras_nlp.api_export import keras_nlp_export
-from keras_nlp.utils.tf_utils import assert_tf_text_installed
 
-try:
-    import tensorflow_text as tf_text
-except ImportError:
-    tf_text = None
+
+def _dim(x, axis):
+    """Return the static size of `axis` of `x` if known, else a tensor."""
+    dim = x.shape[axis]
+    if dim is None:
+        dim = tf.shape(x)[axis]
+    return dim
+
+
+def _round_robin_lengths(lengths, budget):
+    """Allocate `budget` tokens over segments in a round robin fashion.
+
+    `lengths` is a `[batch_size, num_segments]` tensor of segment lengths.
+    Tokens are assigned one at a time to each segment that still needs some,
+    until the budget runs out. Rather than looping, we find the segments that
+    fit in full and split what is left evenly over the remaining segments.
+    """
+    dtype = lengths.dtype
+    num_segments = lengths.shape[-1]
+    # The cost of filling every segment up to each sorted length in turn.
+    sorted_lengths = tf.sort(lengths, axis=1)
+    fill_costs = tf.cumsum(
+        sorted_lengths, axis=1, exclusive=True
+    ) + sorted_lengths * tf.range(num_segments, 0, -1, dtype=dtype)
+    fits = tf.cast(fill_costs <= budget, dtype)
+    num_partial = num_segments - tf.reduce_sum(fits, axis=1)
+    remaining = budget - tf.reduce_sum(sorted_lengths * fits, axis=1)
+    # Segments that do not fit get an even share of the remaining budget, and
+    # the earliest of them get one extra token each for the remainder.
+    safe_num_partial = tf.maximum(num_partial, 1)
+    level = tf.where(
+        num_partial > 0,
+        remaining // safe_num_partial,
+        tf.reduce_max(lengths, axis=1),
+    )[:, tf.newaxis]
+    remainder = (remaining % safe_num_partial)[:, tf.newaxis]
+    partial = lengths > level
+    rank = tf.cumsum(tf.cast(partial, dtype), axis=1, exclusive=True)
+    extra = tf.cast(partial & (rank < remainder), dtype)
+    return tf.minimum(lengths, level) + extra
+
+
+def _waterfall_lengths(lengths, budget):
+    """Allocate `budget` tokens over segments from left to right.
+
+    `lengths` is a `[batch_size, num_segments]` tensor of segment lengths.
+    Each segment is filled up completely before the next one gets any budget.
+    """
+    used = tf.cumsum(lengths, axis=1, exclusive=True)
+    return tf.minimum(lengths, tf.maximum(budget - used, 0))
+
+
+def _static_round_robin_lengths(lengths, budget):
+    """Python version of `_round_robin_lengths` for a single list of lengths."""
+    allocated = [0] * len(lengths)
+    while budget > 0 and allocated != lengths:
+        for i, length in enumerate(lengths):
+            if budget > 0 and allocated[i] < length:
+                allocated[i] += 1
+                budget -= 1
+    return allocated
+
+
+def _static_waterfall_lengths(lengths, budget):
+    """Python version of `_waterfall_lengths` for a single list of lengths."""
+    allocated = []
+    for length in lengths:
+        allocated.append(min(length, budget))
+        budget -= allocated[-1]
+    return allocated
 
 
 @keras_nlp_export("keras_nlp.layers.MultiSegmentPacker")
@@ -77,10 +142,15 @@ class MultiSegmentPacker(keras.layers.Layer):
                     "waterfall" algorithm that allocates quota in a
                     left-to-right manner and fills up the buckets until we run
                     out of budget. It support arbitrary number of segments.
+        jit_compile: bool. If `True`, eager calls with dense, numeric inputs of
+            fully static shape are packed with an XLA compiled function. Each
+            new input shape is compiled separately, so this is best suited to
+            inputs with a fixed shape. All other inputs are packed without
+            XLA. Defaults to `False`.
 
     Returns:
         A tuple with two elements. The first is the dense, packed token
-        sequence. The second is an integer tensor of the same shape, containing
+        sequence. The second is an `int32` tensor of the same shape, containing
         the segment ids.
 
     Examples:
@@ -129,10 +199,9 @@ class MultiSegmentPacker(keras.layers.Layer):
         sep_value=None,
         pad_value=None,
         truncate="round_robin",
+        jit_compile=False,
         **kwargs,
     ):
-        assert_tf_text_installed(self.__class__.__name__)
-
         super().__init__(**kwargs)
         self.sequence_length = sequence_length
         if truncate not in ("round_robin", "waterfall"):
@@ -141,6 +210,7 @@ class MultiSegmentPacker(keras.layers.Layer):
                 "supported. Received %s" % truncate
             )
         self.truncate = truncate
+        self.jit_compile = jit_compile
 
         # Maintain private copies of start/end values for config purposes.
         self._start_value = start_value
@@ -168,6 +238,10 @@ class MultiSegmentPacker(keras.layers.Layer):
         self.end_value = end_value
 
         self.pad_value = pad_value
+        # Special value tensors, keyed by dtype name and created on first use.
+        self._special_value_tensors = {}
+        # Truncation budgets, keyed by the number of segments being packed.
+        self._budgets = {}
 
     def get_config(self):
         config = super().get_config()
@@ -179,6 +253,7 @@ class MultiSegmentPacker(keras.layers.Layer):
                 "sep_value": self._sep_value,
                 "pad_value": self.pad_value,
                 "truncate": self.truncate,
+                "jit_compile": self.jit_compile,
             }
         )
         return config
@@ -188,6 +263,9 @@ class MultiSegmentPacker(keras.layers.Layer):
         # Sanitize inputs.
         if not isinstance(inputs, (list, tuple)):
             inputs = [inputs]
+        # Always hand a list to the traced packing function, so that list and
+        # tuple inputs share a single trace.
+        inputs = list(inputs)
         if not inputs:
             raise ValueError("At least one input is required for packing")
         input_ranks = [x.shape.rank for x in inputs]
@@ -204,95 +282,250 @@ class MultiSegmentPacker(keras.layers.Layer):
         return inputs
 
     def _convert_dense(self, x):
-        """Converts inputs to rank 2 ragged tensors."""
+        """Converts inputs to rank 2 ragged tensors with int32 row splits."""
+        # int32 row splits are plenty for a batch of segments, and halve the
+        # size of all of the index arithmetic done while packing.
         if isinstance(x, tf.Tensor):
-            return tf.RaggedTensor.from_tensor(x)
+            return tf.RaggedTensor.from_tensor(x, row_splits_dtype=tf.int32)
         else:
-            return x
-
-    def _trim_inputs(self, inputs):
-        """Trim inputs to desired length."""
-        num_segments = len(inputs)
-        num_special_tokens = (
-            len(self.start_value)
-            + (num_segments - 1) * len(self.sep_value)
-            + len(self.end_value)
-        )
+            return x.with_row_splits_dtype(tf.int32)
+
+    def _get_budget(self, num_segments):
+        """Return how many segment tokens fit alongside the special tokens."""
+        if num_segments not in self._budgets:
+            num_special_tokens = (
+                len(self.start_value)
+                + (num_segments - 1) * len(self.sep_value)
+                + len(self.end_value)
+            )
+            self._budgets[num_segments] = max(
+                self.sequence_length - num_special_tokens, 0
+            )
+        return self._budgets[num_segments]
+
+    def _allocate_lengths(self, lengths, budget):
+        """Compute how many tokens of each segment to keep."""
         if self.truncate == "round_robin":
-            return tf_text.RoundRobinTrimmer(
-                self.sequence_length - num_special_tokens
-            ).trim(inputs)
+            return _round_robin_lengths(lengths, budget)
         elif self.truncate == "waterfall":
-            return tf_text.WaterfallTrimmer(
-                self.sequence_length - num_special_tokens
-            ).trim(inputs)
+            return _waterfall_lengths(lengths, budget)
         else:
             raise ValueError("Unsupported truncate: %s" % self.truncate)
 
-    def _combine_inputs(self, segments):
-        """Combine inputs with start and end values added."""
-        dtype = segments[0].dtype
-        batch_size = segments[0].nrows()
-        start_value = tf.convert_to_tensor(self.start_value, dtype=dtype)
-        sep_value = tf.convert_to_tensor(self.sep_value, dtype=dtype)
-        end_value = tf.convert_to_tensor(self.end_value, dtype=dtype)
+    def _allocate_static_lengths(self, lengths, budget):
+        """Compute how many tokens of each segment to keep, in Python."""
+        if self.truncate == "round_robin":
+            return _static_round_robin_lengths(lengths, budget)
+        elif self.truncate == "waterfall":
+            return _static_waterfall_lengths(lengths, budget)
+        else:
+            raise ValueError("Unsupported truncate: %s" % self.truncate)
 
-        start_columns = tf.repeat(
-            start_value[tf.newaxis, :], repeats=batch_size, axis=0
-        )
-        sep_columns = tf.repeat(
-            sep_value[tf.newaxis, :], repeats=batch_size, axis=0
-        )
-        end_columns = tf.repeat(
-            end_value[tf.newaxis, :], repeats=batch_size, axis=0
+    def _trim_inputs(self, inputs, lengths):
+        """Compute the trimmed row lengths of ragged inputs.
+
+        `lengths` is a `[batch_size, num_segments]` tensor with the row lengths
+        of `inputs`. Returns how many leading values of each row to keep. No
+        values are copied here; packing reads the kept prefix of each row.
+        """
+        budget = self._get_budget(len(inputs))
+        return self._allocate_lengths(lengths, budget)
+
+    def _trim_dense_inputs(self, inputs):
+        """Trim dense inputs to desired length."""
+        budget = self._get_budget(len(inputs))
+        # Skip trimming entirely when static shapes already show that every
+        # segment fits, e.g. for short, fixed length examples.
+        static_lengths = [x.shape[-1] for x in inputs]
+        if None not in static_lengths and sum(static_lengths) <= budget:
+            return inputs
+        # Dense segments have the same length in every row, so a single
+        # allocation is shared by the whole batch.
+        if None not in static_lengths:
+            # Compute the allocation in Python while tracing, so that every
+            # shape in the packed graph stays static.
+            lengths = self._allocate_static_lengths(static_lengths, budget)
+        else:
+            lengths = tf.stack([tf.shape(x)[-1] for x in inputs])[tf.newaxis]
+            lengths = self._allocate_lengths(lengths, budget)[0]
+        return [x[..., : lengths[i]] for i, x in enumerate(inputs)]
+
+    def _get_special_value_tensors(self, dtype):
+        """Return cached start, sep and end value tensors for `dtype`."""
+        if dtype.name not in self._special_value_tensors:
+            # Lift the constants out of any graph being traced, so they can be
+            # captured by every later trace instead of rebuilt per call.
+            with tf.init_scope():
+                self._special_value_tensors[dtype.name] = (
+                    tf.constant(self.start_value, dtype=dtype),
+                    tf.constant(self.sep_value, dtype=dtype),
+                    tf.constant(self.end_value, dtype=dtype),
+                )
+        return self._special_value_tensors[dtype.name]
+
+    def _combine_inputs(self, segments, lengths):
+        """Combine inputs with start and end values added, and pad to dense.
+
+        Only the leading `lengths[:, i]` values of each row of segment `i` are
+        packed, which applies the truncation computed by `_trim_inputs`.
+        """
+        splits_dtype = segments[0].row_splits.dtype
+        batch_size = tf.shape(lengths, out_type=splits_dtype)[0]
+        start_value, sep_value, end_value = self._get_special_value_tensors(
+            segments[0].dtype
         )
-        ones_sep_columns = tf.ones_like(sep_columns, dtype=tf.int32)
-        ones_end_columns = tf.ones_like(end_columns, dtype=tf.int32)
 
-        segments_to_combine = [start_columns]
-        segment_ids_to_combine = [
-            tf.ones_like(start_columns, dtype=tf.int32) * 0
-        ]
+        def fill_rows(value):
+            return tf.fill([batch_size], tf.constant(value, splits_dtype))
 
+        # All packed tokens are gathered from a single flat buffer holding the
+        # special values followed by the flat values of every segment.
+        values = tf.concat(
+            [start_value, sep_value, end_value]
+            + [seg.flat_values for seg in segments],
+            axis=0,
+        )
+        sep_offset = len(self.start_value)
+        end_offset = sep_offset + len(self.sep_value)
+        segment_offset = end_offset + len(self.end_value)
+
+        # For every row, record where each packed piece starts in `values`,
+        # its length and its segment id.
+        piece_starts = [fill_rows(0)]
+        piece_lengths = [fill_rows(len(self.start_value))]
+        piece_segment_ids = [0]
         for i, seg in enumerate(segments):
-            # Combine all segments.
-            segments_to_combine.append(seg)
-
-            # Combine segment ids.
-            segment_ids_to_combine.append(tf.ones_like(seg, dtype=tf.int32) * i)
+            piece_starts.append(segment_offset + seg.row_starts())
+            piece_lengths.append(lengths[:, i])
+            segment_offset += seg.row_splits[-1]
 
             # Account for the sep/end tokens here.
             if i == len(segments) - 1:
-                segments_to_combine.append(end_columns)
-                segment_ids_to_combine.append(ones_end_columns * i)
+                piece_starts.append(fill_rows(end_offset))
+                piece_lengths.append(fill_rows(len(self.end_value)))
             else:
-                segments_to_combine.append(sep_columns)
-                segment_ids_to_combine.append(ones_sep_columns * i)
-
-        token_ids = tf.concat(segments_to_combine, 1)
-        segment_ids = tf.concat(segment_ids_to_combine, 1)
-        return token_ids, segment_ids
-
-    def call(self, inputs):
-        inputs = self._sanitize_inputs(inputs)
-
-        # If rank 1, add a batch dim.
-        rank_1 = inputs[0].shape.rank == 1
-        if rank_1:
-            inputs = [tf.expand_dims(x, 0) for x in inputs]
-        inputs = [self._convert_dense(x) for x in inputs]
+                piece_starts.append(fill_rows(sep_offset))
+                piece_lengths.append(fill_rows(len(self.sep_value)))
+            piece_segment_ids += [i, i]
+
+        piece_starts = tf.reshape(tf.stack(piece_starts, axis=1), [-1])
+        piece_lengths = tf.stack(piece_lengths, axis=1)
+        row_lengths = tf.reduce_sum(piece_lengths, axis=1)
+        piece_lengths = tf.reshape(piece_lengths, [-1])
+
+        indices = tf.ragged.range(
+            piece_starts,
+            piece_starts + piece_lengths,
+            row_splits_dtype=splits_dtype,
+        )
+        # The row lengths are correct by construction, so skip validation.
+        token_ids = tf.RaggedTensor.from_row_lengths(
+            tf.gather(values, indices.flat_values), row_lengths, validate=False
+        )
+        segment_ids = token_ids.with_flat_values(
+            tf.repeat(
+                tf.tile(tf.constant(piece_segment_ids), [batch_size]),
+                piece_lengths,
+            )
+        )
 
-        segments = self._trim_inputs(inputs)
-        token_ids, segment_ids = self._combine_inputs(segments)
         # Pad to dense tensor output.
         shape = tf.cast([-1, self.sequence_length], tf.int64)
         token_ids = token_ids.to_tensor(
             shape=shape, default_value=self.pad_value
         )
         segment_ids = segment_ids.to_tensor(shape=shape)
-        # Remove the batch dim if added.
-        if rank_1:
-            token_ids = tf.squeeze(token_ids, 0)
-            segment_ids = tf.squeeze(segment_ids, 0)
+        return token_ids, segment_ids
+
+    def _combine_dense_inputs(self, segments):
+        """Combine and pad dense inputs without converting them to ragged."""
+        dtype = segments[0].dtype
+        start_value, sep_value, end_value = self._get_special_value_tensors(
+            dtype
+        )
+        rank_1 = segments[0].shape.rank == 1
+
+        def broadcast_rows(x):
+            if rank_1:
+                return x
+            shape = [_dim(segments[0], 0), _dim(x, 0)]
+            return tf.broadcast_to(x[tf.newaxis, :], shape)
 
-        return (token_ids, segment_ids)
+        pieces = [broadcast_rows(start_value)]
+        segment_lengths = []
+        for i, seg in enumerate(segments):
+            pieces.append(seg)
+            if i == len(segments) - 1:
+                pieces.append(broadcast_rows(end_value))
+                num_special_tokens = len(self.end_value)
+            else:
+                pieces.append(broadcast_rows(sep_value))
+                num_special_tokens = len(self.sep_value)
+            if i == 0:
+                num_special_tokens += len(self.start_value)
+            segment_lengths.append(_dim(seg, -1) + num_special_tokens)
+
+        token_ids = tf.concat(pieces, axis=-1)[..., : self.sequence_length]
+        # Every row shares the same segment ids, which are a constant when all
+        # segment lengths are static.
+        if all(isinstance(n, int) for n in segment_lengths):
+            segment_ids = tf.constant(
+                [i for i, n in enumerate(segment_lengths) for _ in range(n)],
+                dtype=tf.int32,
+            )
+        else:
+            segment_ids = tf.repeat(tf.range(len(segments)), segment_lengths)
+        segment_ids = broadcast_rows(segment_ids[: self.sequence_length])
+
+        # Pad to dense tensor output.
+        pad_value = self.pad_value
+        if pad_value is None:
+            pad_value = tf.zeros([], dtype=dtype)
+        num_pads = self.sequence_length - _dim(token_ids, -1)
+        paddings = [[0, num_pads]] if rank_1 else [[0, 0], [0, num_pads]]
+        token_ids = tf.pad(token_ids, paddings, constant_values=pad_value)
+        segment_ids = tf.pad(segment_ids, paddings)
+        shape = segments[0].shape[:-1].concatenate([self.sequence_length])
+        token_ids.set_shape(shape)
+        segment_ids.set_shape(shape)
+        return token_ids, segment_ids
+
+    def call(self, inputs):
+        # Input checks only run in Python here, outside of the traced `_pack`,
+        # so they never add ops to the packing graph.
+        inputs = self._sanitize_inputs(inputs)
+        # Only eager, numeric dense inputs are guaranteed static shapes, which
+        # XLA needs to compile the packing into a single computation.
+        if (
+            self.jit_compile
+            and tf.executing_eagerly()
+            and all(
+                isinstance(x, tf.Tensor)
+                and x.dtype != tf.string
+                and x.shape.is_fully_defined()
+                for x in inputs
+            )
+        ):
+            return self._pack_xla(inputs)
+        return self._pack(inputs)
+
+    @tf.function(jit_compile=True)
+    def _pack_xla(self, inputs):
+        """Pack dense, static shape inputs with XLA."""
+        segments = self._trim_dense_inputs(inputs)
+        return self._combine_dense_inputs(segments)
+
+    @tf.function(reduce_retracing=True)
+    def _pack(self, inputs):
+        """Trim, combine and pad a list of sanitized input segments."""
+        # Dense inputs, including all rank 1 inputs, are packed without
+        # converting to ragged tensors.
+        if all(isinstance(x, tf.Tensor) for x in inputs):
+            segments = self._trim_dense_inputs(inputs)
+            return self._combine_dense_inputs(segments)
+
+        inputs = [self._convert_dense(x) for x in inputs]
+        # Row lengths are computed once, then shared by trimming and packing.
+        lengths = tf.stack([x.row_lengths() for x in inputs], axis=1)
+        lengths = self._trim_inputs(inputs, lengths)
+        return self._combine_inputs(inputs, lengths)
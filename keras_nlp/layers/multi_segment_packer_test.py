@@ -13,13 +13,24 @@
 # limitations under the License.
 """Tests for multi-segment packing."""
 
+import itertools
 import os
+import random
 
 import tensorflow as tf
 from absl.testing import parameterized
 from tensorflow import keras
 
 from keras_nlp.layers.multi_segment_packer import MultiSegmentPacker
+from keras_nlp.layers.multi_segment_packer import _round_robin_lengths
+from keras_nlp.layers.multi_segment_packer import _static_round_robin_lengths
+from keras_nlp.layers.multi_segment_packer import _static_waterfall_lengths
+from keras_nlp.layers.multi_segment_packer import _waterfall_lengths
+
+try:
+    import tensorflow_text as tf_text
+except ImportError:
+    tf_text = None
 
 
 class MultiSegmentPackerTest(tf.test.TestCase, parameterized.TestCase):
@@ -69,6 +80,38 @@ class MultiSegmentPackerTest(tf.test.TestCase, parameterized.TestCase):
             ),
         )
 
+    def test_trim_three_inputs_round_robin(self):
+        seq1 = tf.constant([1, 2, 3, 4, 5])
+        seq2 = tf.constant([11])
+        seq3 = tf.constant([21, 22, 23, 24])
+        packer = MultiSegmentPacker(
+            10, start_value=101, end_value=102, truncate="round_robin"
+        )
+        output = packer([seq1, seq2, seq3])
+        self.assertAllEqual(
+            output,
+            (
+                [101, 1, 2, 3, 102, 11, 102, 21, 22, 102],
+                [0, 0, 0, 0, 0, 1, 1, 2, 2, 2],
+            ),
+        )
+
+    def test_trim_three_inputs_waterfall(self):
+        seq1 = tf.constant([1, 2, 3, 4, 5])
+        seq2 = tf.constant([11])
+        seq3 = tf.constant([21, 22, 23, 24])
+        packer = MultiSegmentPacker(
+            10, start_value=101, end_value=102, truncate="waterfall"
+        )
+        output = packer([seq1, seq2, seq3])
+        self.assertAllEqual(
+            output,
+            (
+                [101, 1, 2, 3, 4, 5, 102, 11, 102, 102],
+                [0, 0, 0, 0, 0, 0, 0, 1, 1, 2],
+            ),
+        )
+
     def test_trim_batched_inputs_round_robin(self):
         seq1 = tf.constant([["a", "b", "c"], ["a", "b", "c"]])
         seq2 = tf.constant([["x", "y", "z"], ["x", "y", "z"]])
@@ -90,6 +133,38 @@ class MultiSegmentPackerTest(tf.test.TestCase, parameterized.TestCase):
             ),
         )
 
+    def test_trim_batched_ragged_inputs_round_robin(self):
+        seq1 = tf.ragged.constant(
+            [[1, 2, 3, 4, 5], [], [1, 2], [1, 2, 3, 4, 5, 6, 7]]
+        )
+        seq2 = tf.ragged.constant(
+            [[11], [11, 12, 13, 14], [11], [11, 12, 13, 14, 15, 16, 17]]
+        )
+        seq3 = tf.ragged.constant(
+            [[21, 22, 23, 24], [21, 22, 23, 24], [21], [21, 22, 23, 24, 25]]
+        )
+        packer = MultiSegmentPacker(
+            10, start_value=101, end_value=102, truncate="round_robin"
+        )
+        output = packer([seq1, seq2, seq3])
+        self.assertAllEqual(
+            output,
+            (
+                [
+                    [101, 1, 2, 3, 102, 11, 102, 21, 22, 102],
+                    [101, 102, 11, 12, 13, 102, 21, 22, 23, 102],
+                    [101, 1, 2, 102, 11, 102, 21, 102, 0, 0],
+                    [101, 1, 2, 102, 11, 12, 102, 21, 22, 102],
+                ],
+                [
+                    [0, 0, 0, 0, 0, 1, 1, 2, 2, 2],
+                    [0, 0, 1, 1, 1, 1, 2, 2, 2, 2],
+                    [0, 0, 0, 0, 1, 1, 2, 2, 0, 0],
+                    [0, 0, 0, 0, 1, 1, 1, 2, 2, 2],
+                ],
+            ),
+        )
+
     def test_trim_batched_inputs_waterfall(self):
         seq1 = tf.ragged.constant([["a", "b", "c"], ["a", "b"]])
         seq2 = tf.constant([["x", "y", "z"], ["x", "y", "z"]])
@@ -111,6 +186,40 @@ class MultiSegmentPackerTest(tf.test.TestCase, parameterized.TestCase):
             ),
         )
 
+    @parameterized.named_parameters(
+        ("round_robin", _round_robin_lengths, _static_round_robin_lengths),
+        ("waterfall", _waterfall_lengths, _static_waterfall_lengths),
+    )
+    def test_static_and_tensor_allocation_agree(self, fn, static_fn):
+        for num_segments in range(1, 4):
+            lengths = list(itertools.product(range(5), repeat=num_segments))
+            for budget in range(4 * num_segments + 2):
+                expected = [static_fn(list(x), budget) for x in lengths]
+                self.assertAllEqual(fn(tf.constant(lengths), budget), expected)
+
+    @parameterized.named_parameters(
+        ("round_robin", _round_robin_lengths, "RoundRobinTrimmer"),
+        ("waterfall", _waterfall_lengths, "WaterfallTrimmer"),
+    )
+    def test_allocation_matches_tf_text_trimmers(self, fn, trimmer_name):
+        if tf_text is None:
+            self.skipTest("tensorflow_text is not installed")
+        rng = random.Random(1337)
+        for num_segments in range(1, 5):
+            for _ in range(10):
+                segments = [
+                    tf.ragged.range([rng.randint(0, 6) for _ in range(8)])
+                    for _ in range(num_segments)
+                ]
+                lengths = tf.stack([x.row_lengths() for x in segments], axis=1)
+                for budget in range(0, 6 * num_segments + 2, 3):
+                    trimmer = getattr(tf_text, trimmer_name)(budget)
+                    expected = tf.stack(
+                        [x.row_lengths() for x in trimmer.trim(segments)],
+                        axis=1,
+                    )
+                    self.assertAllEqual(fn(lengths, budget), expected)
+
     def test_pad_inputs(self):
         seq1 = tf.constant(["a"])
         seq2 = tf.constant(["x"])
@@ -147,6 +256,25 @@ class MultiSegmentPackerTest(tf.test.TestCase, parameterized.TestCase):
             ),
         )
 
+    def test_pad_dense_batched_inputs(self):
+        seq1 = tf.constant([[1, 2], [3, 4]])
+        seq2 = tf.constant([[5], [6]])
+        packer = MultiSegmentPacker(8, start_value=101, end_value=102)
+        output = packer([seq1, seq2])
+        self.assertAllEqual(
+            output,
+            (
+                [
+                    [101, 1, 2, 102, 5, 102, 0, 0],
+                    [101, 3, 4, 102, 6, 102, 0, 0],
+                ],
+                [
+                    [0, 0, 0, 0, 1, 1, 0, 0],
+                    [0, 0, 0, 0, 1, 1, 0, 0],
+                ],
+            ),
+        )
+
     def test_list_special_tokens(self):
         seq1 = tf.ragged.constant([["a", "b"], ["a", "b"]])
         seq2 = tf.ragged.constant([["x", "y"], ["x"]])
@@ -173,6 +301,67 @@ class MultiSegmentPackerTest(tf.test.TestCase, parameterized.TestCase):
             ),
         )
 
+    def test_repeated_calls_with_varying_shapes(self):
+        packer = MultiSegmentPacker(6, start_value=1, end_value=2)
+        output = packer([tf.ragged.constant([[3], [3, 4, 5]])])
+        self.assertAllEqual(output[0], [[1, 3, 2, 0, 0, 0], [1, 3, 4, 5, 2, 0]])
+        output = packer([tf.ragged.constant([[3, 4], [5], [6, 7, 8, 9, 10]])])
+        self.assertAllEqual(
+            output[0],
+            [[1, 3, 4, 2, 0, 0], [1, 5, 2, 0, 0, 0], [1, 6, 7, 8, 9, 2]],
+        )
+
+    def test_varying_dense_lengths_do_not_retrace(self):
+        packer = MultiSegmentPacker(6, start_value=1, end_value=2)
+        output = packer(tf.constant([3]))
+        self.assertAllEqual(output[0], [1, 3, 2, 0, 0, 0])
+        output = packer(tf.constant([3, 4, 5]))
+        self.assertAllEqual(output[0], [1, 3, 4, 5, 2, 0])
+        output = packer(tf.constant([3, 4, 5, 6]))
+        self.assertAllEqual(output[0], [1, 3, 4, 5, 6, 2])
+        output = packer(tf.constant([3, 4, 5, 6, 7, 8]))
+        self.assertAllEqual(output[0], [1, 3, 4, 5, 6, 2])
+        self.assertLess(packer._pack.experimental_get_tracing_count(), 4)
+
+    @parameterized.named_parameters(
+        ("round_robin", "round_robin"),
+        ("waterfall", "waterfall"),
+    )
+    def test_jit_compile(self, truncate):
+        seq1 = tf.constant([[1, 2, 3, 4, 5], [6, 7, 8, 9, 10]])
+        seq2 = tf.constant([[11, 12], [13, 14]])
+        packer = MultiSegmentPacker(
+            8, start_value=101, end_value=102, truncate=truncate
+        )
+        jit_packer = MultiSegmentPacker(
+            8,
+            start_value=101,
+            end_value=102,
+            truncate=truncate,
+            jit_compile=True,
+        )
+        self.assertAllEqual(jit_packer([seq1, seq2]), packer([seq1, seq2]))
+        self.assertAllEqual(jit_packer(seq1[0]), packer(seq1[0]))
+
+    def test_list_and_tuple_inputs(self):
+        seq1 = tf.ragged.constant([["a", "b"], ["a"]])
+        seq2 = tf.ragged.constant([["x"], ["x", "y"]])
+        packer = MultiSegmentPacker(
+            6, start_value="[CLS]", end_value="[SEP]", pad_value="[PAD]"
+        )
+        expected = (
+            [
+                ["[CLS]", "a", "b", "[SEP]", "x", "[SEP]"],
+                ["[CLS]", "a", "[SEP]", "x", "y", "[SEP]"],
+            ],
+            [
+                [0, 0, 0, 0, 1, 1],
+                [0, 0, 0, 1, 1, 1],
+            ],
+        )
+        self.assertAllEqual(packer([seq1, seq2]), expected)
+        self.assertAllEqual(packer((seq1, seq2)), expected)
+
     def test_config(self):
         seq1 = tf.ragged.constant([["a", "b", "c"], ["a", "b"]])
         seq2 = tf.ragged.constant([["x", "y", "z"], ["x", "y", "z"]])